@@ -5,6 +5,7 @@
 #   "appdirs",
 #   "click",
 #   "gitpython",
+#   "orjson",
 #   "packaging",
 # ]
 # ///
@@ -25,17 +26,35 @@ from packaging.utils import canonicalize_name
 from packaging.version import Version
 from pathlib import Path
 import appdirs
-from git import Repo, InvalidGitRepositoryError, Tag
-from urllib.parse import urlparse
+from git import Repo, GitCommandError, InvalidGitRepositoryError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import functools
 import json
 import click
 import re
-import textwrap
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    _json_loads = json.loads
 
 
 CACHE_DIR = Path(appdirs.user_cache_dir("slint.changelog.py"))
 GIT_REPOS_DIR = CACHE_DIR / "git_repos"
 
+# Matches "closes #123"-style issue references in commit messages
+_ISSUE_REF_RE = re.compile(r"(\(| )(#\d+)")
+# Matches "package==1.2.3" pins in requirements.txt-style lockfiles
+_REQ_LINE_RE = re.compile(r"^([^#=\s]+)==([^\s;]+)", re.M)
+# Matches entire "Co-authored-by: ..." trailer lines
+_COAUTH_RE = re.compile(r"^.*co-authored.*\n?", re.IGNORECASE | re.MULTILINE)
+# Extracts "owner/repo" from the end of a git remote URL
+_REPO_NAME_RE = re.compile(r"[:/]([^/:]+/[^/:]+?)(?:\.git)?/?$")
+
+# Most names/versions repeat between the two lockfile snapshots, so memoize
+_canon = functools.lru_cache(maxsize=4096)(canonicalize_name)
+_ver = functools.lru_cache(maxsize=4096)(Version)
+
 
 def find_repo(lockfile: Path, depth=2) -> Repo | None:
     # Go up the chain until we find a git repository
@@ -47,21 +66,18 @@ def find_repo(lockfile: Path, depth=2) -> Repo | None:
             parent = parent.parent
 
 
-def deps_from_lockfile(lockfile: Path, data: str) -> dict[str, Version]:
+def deps_lines_from_lockfile(lockfile: Path, data: str) -> dict[str, str]:
+    """Parse raw (non-canonicalized) name/version pins from a lockfile."""
     deps = {}
     if lockfile.match("Pipfile.lock"):
-        for package, info in json.loads(data)["default"].items():
+        for package, info in _json_loads(data)["default"].items():
             if "version" in info:
                 deps[package] = info["version"].replace("==", "")
     elif lockfile.match("requirements*.txt"):
-        lines = data.splitlines()
-        for line in lines:
-            if line.startswith("#"):
-                continue
-            package, version = line.split("==")
-            deps[package] = version
+        # findall keeps the whole loop in C-land
+        deps = dict(_REQ_LINE_RE.findall(data))
 
-    return {canonicalize_name(k): Version(v) for k, v in deps.items()}
+    return deps
 
 
 def diff_deps(
@@ -71,63 +87,109 @@ def diff_deps(
     until: str | None = None,
 ) -> dict[str, tuple[Version, Version]]:
     """Diff dependencies between lockfiles."""
-    since_commit = repo.commit(since or "HEAD")
-    prev_deps_data = (since_commit.tree / str(lockfile)).data_stream.read().decode()
-    prev_deps = deps_from_lockfile(lockfile, prev_deps_data)
+    # `git show` is a single subprocess, vs. GitPython's streamed blob reads
+    prev_deps_data = repo.git.show(f"{since or 'HEAD'}:{lockfile}")
+    prev_deps = deps_lines_from_lockfile(lockfile, prev_deps_data)
 
     if until:
-        cur_deps_data = (
-            (repo.commit(until).tree / str(lockfile)).data_stream.read().decode()
-        )
+        cur_deps_data = repo.git.show(f"{until}:{lockfile}")
     else:
         cur_deps_data = lockfile.read_text()
-    cur_deps = deps_from_lockfile(lockfile, cur_deps_data)
+    cur_deps = deps_lines_from_lockfile(lockfile, cur_deps_data)
 
+    # Only canonicalize and Version-parse the pins that actually differ; usually
+    # just a handful of dependencies change between two lockfile snapshots.
+    changed_names = {name for name, _ in prev_deps.items() ^ cur_deps.items()}
     changed_deps = {}
-    for package, cur_version in cur_deps.items():
-        prev_version = prev_deps.get(package)
-        if prev_version != cur_version:
-            changed_deps[package] = (prev_version, cur_version)
+    for name, cur_version in cur_deps.items():
+        if name not in changed_names:
+            continue
+        prev_version = prev_deps.get(name)
+        changed_deps[_canon(name)] = (
+            _ver(prev_version) if prev_version else None,
+            _ver(cur_version),
+        )
 
     return changed_deps
 
 
-def repo_tag(repo: Repo, version: Version, fetch: bool = True) -> Tag | None:
-    """Get the version of a tag in the repository."""
-    repo_tags = repo.tags
-    for tag in (str(version), f"v{version}"):
-        if tag in repo_tags:
-            return repo_tags[tag]
+# Tag lookup tables, keyed on `id(repo)` since `Repo` objects aren't hashable
+_tag_indexes: dict[int, dict[str, str]] = {}
+
 
-    # Do a reverse search without the "v" prefix
-    for t in repo_tags:
-        if t.name.lstrip("v") == str(version):
-            return t
-    if fetch:
+def _tag_index(repo: Repo) -> dict[str, str]:
+    """Build (once per repo) a lookup table of tag names, also without "v" prefixes."""
+    if id(repo) not in _tag_indexes:
+        # One for-each-ref subprocess beats GitPython resolving a TagReference
+        # per entry, which dominates for tag-heavy repos.
+        names = repo.git.for_each_ref(
+            "refs/tags/", format="%(refname:short)"
+        ).splitlines()
+        index = {name: name for name in names}
+        index |= {name.lstrip("v"): name for name in names}
+        _tag_indexes[id(repo)] = index
+    return _tag_indexes[id(repo)]
+
+
+def resolve_tags(
+    repo: Repo,
+    versions: list[Version],
+    fetch: bool = True,
+) -> dict[Version, str | None]:
+    """Resolve versions to tag names, fetching at most once for any missing ones."""
+    index = _tag_index(repo)
+    tags = {v: index.get(str(v)) or index.get(f"v{v}") for v in versions}
+    missing = [v for v, tag in tags.items() if not tag]
+    if missing and fetch:
         click.secho(f"Fetching {repo}...", fg="yellow", err=True)
-        for remote in repo.remotes:
-            remote.fetch("+refs/heads/*:refs/heads/*", filter="blob:none")
-        return repo_tag(repo, version, fetch=False)
+        try:
+            # Probe the remote in a single round-trip and fetch only the matching
+            # tags, instead of pulling in the entire branch history.
+            candidates = [t for v in missing for t in (str(v), f"v{v}")]
+            out = repo.git.ls_remote("--tags", "origin", *candidates)
+            refs = [line.split("\t")[1] for line in out.splitlines()]
+            refspecs = [f"+{r}:{r}" for r in refs if not r.endswith("^{}")]
+            if not refspecs:
+                raise LookupError("Tags not advertised by the remote")
+            repo.git.fetch("origin", *refspecs, filter="tree:0")
+        except (GitCommandError, IndexError, LookupError):
+            # Tags not advertised (or filter rejected); fall back to a full fetch
+            for remote in repo.remotes:
+                try:
+                    remote.fetch("+refs/heads/*:refs/heads/*", filter="tree:0")
+                except GitCommandError:
+                    # Some servers only allow blob filters
+                    remote.fetch("+refs/heads/*:refs/heads/*", filter="blob:none")
+        # The fetch might have brought in new tags
+        _tag_indexes.pop(id(repo), None)
+        return resolve_tags(repo, versions, fetch=False)
+    return tags
+
+
+def repo_tag(repo: Repo, version: Version, fetch: bool = True) -> str | None:
+    """Get the name of a tag in the repository."""
+    return resolve_tags(repo, [version], fetch=fetch)[version]
 
 
 def generate_changelog(
-    package: str,
+    repo: Repo,
+    repo_url: str,
     prev_ver: Version | None,
     cur_ver: Version,
     fetch: bool = True,
+    message_filter: str | None = None,
 ) -> tuple[str, list[str]]:
-    res = []
-    repo = get_package_repo(package)
-    repo_url = list(repo.remote("origin").urls)[0]
+    # Resolve both tags in one go, so that at most one fetch happens per package
+    versions = [v for v in (prev_ver, cur_ver) if v is not None]
+    tags = resolve_tags(repo, versions, fetch=fetch)
 
-    if prev_ver is None:
-        prev_tag = ""
-    else:
-        prev_tag = repo_tag(repo, prev_ver, fetch=fetch)
+    prev_tag = ""
+    if prev_ver is not None:
+        prev_tag = tags[prev_ver]
         if not prev_tag:
             raise ValueError(f"Tag for {prev_ver} not found in {repo_url}.")
 
-    cur_tag = repo_tag(repo, cur_ver, fetch=fetch)
+    cur_tag = tags[cur_ver]
     if not cur_tag:
         raise ValueError(f"Tag for {cur_ver} not found in {repo_url}.")
 
@@ -135,13 +197,26 @@ def generate_changelog(
         commit_range = f"{cur_tag}"
     else:
         commit_range = f"{prev_tag}...{cur_tag}"
-    for c in repo.iter_commits(commit_range):
-        res.append(c.message.strip())
+    # A single NUL-delimited `git log` is much faster than GitPython hydrating a
+    # full Commit object per entry. Filtering in git also avoids piping out
+    # commit messages we would just throw away.
+    log_kwargs = {}
+    if message_filter:
+        log_kwargs = {"grep": message_filter, "invert_grep": True, "perl_regexp": True}
+    log = repo.git.log(commit_range, format="%B%x00", **log_kwargs)
+    res = [message.strip() for message in log.split("\0") if message.strip()]
     return repo_url, res
 
 
+# Known-cloned packages; one directory listing replaces a stat() per lookup
+_existing_repos = (
+    {p.name for p in GIT_REPOS_DIR.iterdir()} if GIT_REPOS_DIR.exists() else set()
+)
+
+
+@functools.lru_cache(maxsize=None)
 def get_package_repo(package: str) -> Repo:
-    """Clone the dependency repository."""
+    """Clone (or reuse) the dependency repository."""
     # Sometimes Python deps are available both using underscores ("_"), but their
     # canonical name needs dashes ("_").
     package = package.replace("_", "-")
@@ -155,17 +230,31 @@ def get_package_repo(package: str) -> Repo:
         repo_url = f"https://github.com/inveniosoftware/{package}"
 
     repo_dir = GIT_REPOS_DIR / f"{package}.git"
-    if not repo_dir.exists():
+    if repo_dir.name not in _existing_repos:
         repo_dir.mkdir(parents=True)
-        repo = Repo.clone_from(
-            repo_url,
-            repo_dir,
-            origin="origin",
-            bare=True,
-            filter="blob:none",
-        )
+        try:
+            # We only ever read commit messages and tags, so we can skip trees too
+            repo = Repo.clone_from(
+                repo_url,
+                repo_dir,
+                origin="origin",
+                bare=True,
+                filter="tree:0",
+            )
+        except GitCommandError:
+            # Some servers only allow blob filters
+            repo = Repo.clone_from(
+                repo_url,
+                repo_dir,
+                origin="origin",
+                bare=True,
+                filter="blob:none",
+            )
+        _existing_repos.add(repo_dir.name)
     else:
         repo = Repo(repo_dir)
+    # Stash the origin URL so callers don't re-read the git config per call
+    repo._cached_origin_url = next(iter(repo.remote("origin").urls))
     return repo
 
 
@@ -196,6 +285,14 @@ def get_package_repo(package: str) -> Repo:
     default="-",
     help="The file to write the changelog to.",
 )
+@click.option(
+    "--jobs",
+    type=int,
+    default=None,
+    help="Number of parallel changelog jobs. The work is network-bound (git "
+    "clones/fetches), so tune this to your connection. Defaults to one job per "
+    "changed dependency, capped at 8.",
+)
 @click.option("--cache-dir", is_flag=True, help="Print the cache directory.")
 def main_cli(
     lockfile,
@@ -204,6 +301,7 @@ def main_cli(
     package_filter,
     message_filter,
     output,
+    jobs,
     cache_dir,
 ):
     """Run the changelog generator."""
@@ -222,22 +320,50 @@ def main_cli(
         raise click.ClickException("Could not find git repository of lockfile.")
 
     changed_deps = diff_deps(repo, lockfile, since, until)
-    message_filter = message_filter and re.compile(message_filter)
     package_filter = package_filter and re.compile(package_filter)
-    issue_ref_regex = re.compile(r"(\(| )(#\d+)")
-    for package, (prev_ver, cur_ver) in changed_deps.items():
-        if package_filter and not package_filter.search(package):
-            continue
+    if package_filter:
+        changed_deps = {
+            package: versions
+            for package, versions in changed_deps.items()
+            if package_filter.search(package)
+        }
+
+    # Changelog generation is network-bound (cloning/fetching the package repos), so
+    # run the per-package jobs concurrently and only format on the main thread.
+    jobs = jobs or max(1, min(8, len(changed_deps)))
+    results = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {}
+        for package, (prev_ver, cur_ver) in changed_deps.items():
+            # Clone/open repos on the main thread so workers only do read-only
+            # operations and clone decisions can't race on the same package.
+            try:
+                repo = get_package_repo(package)
+            except Exception as e:
+                click.secho(f"Error generating changelog for {package}: {e}", err=True)
+                continue
+            future = executor.submit(
+                generate_changelog,
+                repo,
+                repo._cached_origin_url,
+                prev_ver,
+                cur_ver,
+                message_filter=message_filter,
+            )
+            futures[future] = package
+        for future in as_completed(futures):
+            results[futures[future]] = future
 
+    # Print in insertion order to keep the output deterministic.
+    for package, (prev_ver, cur_ver) in changed_deps.items():
+        if package not in results:
+            continue  # cloning failed, and the error was already reported
         try:
-            repo_url, changes = generate_changelog(package, prev_ver, cur_ver)
-            repo_name = urlparse(repo_url).path[1:].removesuffix(".git")
-
-            if message_filter:
-                changes = [c for c in changes if not message_filter.search(c)]
+            repo_url, changes = results[package].result()
+            repo_name = _REPO_NAME_RE.search(repo_url).group(1)
 
             # Rewrite "closes #123" to "closes {repo_full_name}#123"
-            changes = [issue_ref_regex.sub(rf"\1{repo_name}\2", c) for c in changes]
+            changes = [_ISSUE_REF_RE.sub(rf"\1{repo_name}\2", c) for c in changes]
 
             bump_icon = ""
             if prev_ver is None:
@@ -253,9 +379,13 @@ def main_cli(
                 underline=True,
                 file=output,
             )
-            changelist = textwrap.indent("\n".join(changes), "    ")
+            # Indent and drop co-author trailers in a single pass, instead of
+            # materializing the joined message bodies multiple times
             changelist = "\n".join(
-                [l for l in changelist.splitlines() if "co-authored" not in l.lower()]
+                f"    {line}" if line.strip() else line
+                for change in changes
+                for line in change.splitlines()
+                if not _COAUTH_RE.match(line)
             )
             click.echo(changelist)
         except Exception as e: